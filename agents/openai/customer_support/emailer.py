@@ -5,29 +5,36 @@ import email
 import smtplib
 import ssl
 import socket
-from email.mime.text import MIMEText
-from email.message import Message
-from email.mime.multipart import MIMEMultipart
+from email import policy
+from email.message import EmailMessage, Message
+from email.parser import BytesParser, BytesHeaderParser
+import base64
+import quopri
 from email.utils import parseaddr, make_msgid
 from typing import List, Tuple, Callable, Union, Awaitable, Optional
 import asyncio
+import functools
 import json
+import logging
 import re
 from datetime import datetime
 from email.utils import parsedate_to_datetime
 import os
+import threading
+import time
 
 # Handle dotenv import more gracefully
 try:
     # Try to import python-dotenv
     from dotenv import load_dotenv  # type: ignore
     load_dotenv()  # Load environment variables from .env file
-    print("Loaded environment variables from .env file")
 except ImportError:
     def load_dotenv() -> None:
         pass
     load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 class Email:
     def __init__(
@@ -39,19 +46,23 @@ class Email:
         id: str = "",
         message_id: str = "",
         references: str = "",
-        date: datetime = datetime.now(),
+        date: Optional[datetime] = None,
     ):
         self.id = id
         self.to_address = to_address
         self.from_address = from_address
         self.subject = subject
         self.body = body
-        self.date = date
+        # A datetime.now() default argument would be frozen at import time;
+        # compute the fallback per instance instead
+        self.date = date if date is not None else datetime.now()
         self.message_id = message_id  # Store the Message-ID header
         self.references = references  # Store the References header
 
-    def to_message(self, reply_to: str) -> MIMEMultipart:
-        msg = MIMEMultipart()
+    def to_message(self, reply_to: str) -> EmailMessage:
+        # The reply has exactly one HTML part, so a bare EmailMessage
+        # avoids the MIMEMultipart container and its extra encode pass
+        msg = EmailMessage()
         msg["From"] = self.from_address
         msg["To"] = self.to_address
 
@@ -75,7 +86,7 @@ class Email:
         msg["Reply-To"] = reply_to
 
         # Add the HTML body
-        msg.attach(MIMEText(f"<html><body>{self.body}</body></html>", "html"))
+        msg.set_content(f"<html><body>{self.body}</body></html>", subtype="html")
         return msg
 
     def to_dict(self):
@@ -91,6 +102,124 @@ class Email:
         }
 
 
+# Cap on how much of a text part we pull down in one FETCH; larger parts
+# are partial-fetched so oversized bodies never transit the wire in full
+_MAX_PART_FETCH = 65536
+
+# UIDs per batched FETCH; large unread backlogs are split so a single
+# command never exceeds server request-size limits
+_FETCH_BATCH_SIZE = 100
+
+# RFC 2177 requires re-issuing IDLE at least every 29 minutes
+_IDLE_TIMEOUT = 29 * 60
+
+# Shared parsers on the modern (non-Compat32) API; policy.default is
+# faster on header-heavy messages and provides get_body()
+_PARSER = BytesParser(policy=policy.default)
+_HEADER_PARSER = BytesHeaderParser(policy=policy.default)
+
+# Compiled once; these run on every fetched message. The bytes patterns
+# match IMAP response metadata directly without a decode pass.
+_THRID_RE = re.compile(rb"X-GM-THRID\s+(\d+)")
+_UID_RE = re.compile(rb"UID (\d+)")
+_ANGLE_ID_RE = re.compile(r"<([^>]+)>")
+_LIST_RE = re.compile(r'^\((?P<flags>[^)]*)\)\s+"(?P<delim>[^"]*)"\s+(?P<name>.+)$')
+
+# In-process DNS cache so reconnects (which happen on every SMTP retry)
+# don't pay a synchronous gethostbyname each time
+_DNS_CACHE: dict[str, Tuple[float, str]] = {}
+_DNS_CACHE_TTL = 60.0
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_date(date_str: str) -> datetime:
+    # parsedate_to_datetime is a regex-heavy RFC 2822 parser; identical
+    # Date strings recur during thread expansion, so memoize it
+    return parsedate_to_datetime(date_str)
+
+
+def _cached_gethostbyname(host: str) -> str:
+    cached = _DNS_CACHE.get(host)
+    now = time.monotonic()
+    if cached and now - cached[0] < _DNS_CACHE_TTL:
+        return cached[1]
+    address = socket.gethostbyname(host)
+    _DNS_CACHE[host] = (now, address)
+    return address
+
+
+def _parse_imap_list(data: str, index: int) -> Tuple[List[object], int]:
+    """Parse a parenthesized IMAP list (as in BODYSTRUCTURE responses) into
+    nested Python lists. ``index`` must point at the opening parenthesis."""
+    items: List[object] = []
+    i = index + 1
+    while i < len(data):
+        ch = data[i]
+        if ch == "(":
+            sub, i = _parse_imap_list(data, i)
+            items.append(sub)
+        elif ch == ")":
+            return items, i + 1
+        elif ch == '"':
+            j = i + 1
+            buf: List[str] = []
+            while j < len(data) and data[j] != '"':
+                if data[j] == "\\" and j + 1 < len(data):
+                    j += 1
+                buf.append(data[j])
+                j += 1
+            items.append("".join(buf))
+            i = j + 1
+        elif ch.isspace():
+            i += 1
+        else:
+            j = i
+            while j < len(data) and data[j] not in ' ()"':
+                j += 1
+            items.append(data[i:j])
+            i = j
+    return items, i
+
+
+def _find_plain_part(
+    structure: List[object], prefix: str = ""
+) -> Union[Tuple[str, str, str, int], None]:
+    """Locate the first text/plain part in a parsed BODYSTRUCTURE.
+
+    Returns ``(section, charset, encoding, size)`` or None when the message
+    has no text/plain part.
+    """
+    if structure and isinstance(structure[0], list):
+        # Multipart: the leading elements are the child parts, 1-indexed
+        for index, child in enumerate(structure, start=1):
+            if not isinstance(child, list):
+                break
+            section = f"{prefix}.{index}" if prefix else str(index)
+            found = _find_plain_part(child, section)
+            if found:
+                return found
+        return None
+    if (
+        len(structure) >= 7
+        and isinstance(structure[0], str)
+        and structure[0].lower() == "text"
+        and str(structure[1]).lower() == "plain"
+    ):
+        charset = "utf-8"
+        params = structure[2]
+        if isinstance(params, list):
+            for k in range(0, len(params) - 1, 2):
+                if str(params[k]).lower() == "charset":
+                    charset = str(params[k + 1])
+        encoding = str(structure[5]).lower()
+        try:
+            size = int(str(structure[6]))
+        except ValueError:
+            size = 0
+        return prefix or "1", charset, encoding, size
+    return None
+
+
 class Emailer:
     """
     Emailer is an IMAP/SMTP client that can be used to fetch and respond to emails.
@@ -127,117 +256,169 @@ class Emailer:
 
         # Persistent IMAP connection
         self.imap_conn = None
+        # Currently selected mailbox, so we skip redundant SELECTs
+        self._selected_mbox: Optional[str] = None
 
-        print("Email configuration initialized with:")
-        print(f"  SMTP Server: {self.smtp_server}")
-        print(f"  SMTP Port: {self.smtp_port}")
-        print(f"  SMTP Username: {self.smtp_username}")
-        print(f"  Email Address: {self.email_address}")
-        print(f"  Support Address: {self.support_address}")
+        # Drafts mailbox name, detected once via LIST and cached
+        self.drafts_folder: Optional[str] = None
 
-    def _ensure_imap_connection(self) -> imaplib.IMAP4_SSL:
-        """Ensure we have a valid IMAP connection, reconnecting if necessary."""
+        # Whether the server advertises IDLE; a stable property of the
+        # connection, checked once per connection
+        self._idle_supported: Optional[bool] = None
+
+        # Persistent SMTP connection, reused across process() cycles.
+        # The lock serializes sends from concurrent handler tasks.
+        self.smtp_conn: Union[smtplib.SMTP_SSL, smtplib.SMTP, None] = None
+        self._smtp_lock = threading.Lock()
+
+        # IMAP sessions are not thread-safe; this serializes commands now
+        # that operations run from multiple asyncio.to_thread workers
+        self._imap_lock = threading.Lock()
+
+        # Warm the DNS cache so the first connect skips the lookup
         try:
-            # Check if connection exists and is still alive
-            if self.imap_conn is not None:
-                try:
-                    # NOOP command to check if connection is still alive
-                    status, _ = self.imap_conn.noop()
-                    if status == 'OK':
-                        print("Using existing IMAP connection")
-                        return self.imap_conn
-                except Exception as e:
-                    print(f"Existing IMAP connection is stale: {str(e)}")
-                    # Close the stale connection if possible
-                    try:
-                        self.imap_conn.logout()
-                    except:
-                        pass
-                    self.imap_conn = None
+            _cached_gethostbyname(self.smtp_server)
+        except socket.gaierror:
+            pass
+
+        logger.info(
+            "Email configuration initialized: smtp=%s:%s user=%s email=%s support=%s",
+            self.smtp_server,
+            self.smtp_port,
+            self.smtp_username,
+            self.email_address,
+            self.support_address,
+        )
+
+    def _ensure_imap_connection(self) -> imaplib.IMAP4_SSL:
+        """Ensure we have an IMAP connection, reconnecting if necessary.
+
+        No liveness probe here: a NOOP round trip per call is redundant
+        because a dead socket surfaces on the next real command, and callers
+        reconnect through _drop_imap_connection and retry.
+        """
+        if self.imap_conn is not None:
+            return self.imap_conn
 
+        try:
             # Create a new connection
-            print(f"Connecting to IMAP server {self.imap_server}:{self.imap_port}...")
+            logger.info("Connecting to IMAP server %s:%s...", self.imap_server, self.imap_port)
             self.imap_conn = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
             self.imap_conn.login(self.email_address, self.email_password)
-            print(f"Successfully logged in to IMAP server as {self.email_address}")
+            logger.info("Successfully logged in to IMAP server as %s", self.email_address)
 
             # Select the INBOX folder
             self.imap_conn.select("INBOX")
+            self._selected_mbox = "INBOX"
             return self.imap_conn
 
         except Exception as e:
-            print(f"Error connecting to IMAP server: {str(e)}")
+            logger.error("Error connecting to IMAP server: %s", e)
             self.imap_conn = None
+            self._selected_mbox = None
             raise
 
-    def _connect_to_email(self) -> Tuple[imaplib.IMAP4_SSL, Union[smtplib.SMTP_SSL, smtplib.SMTP]]:
-        """Establish connections to email servers (both IMAP and SMTP)."""
-        # Get IMAP connection
-        imap_conn = self._ensure_imap_connection()
-
-        # Connect to SMTP server
-        smtp_conn = self._connect_to_smtp()
+    def _drop_imap_connection(self) -> None:
+        """Discard the cached IMAP connection so the next call reconnects."""
+        if self.imap_conn is not None:
+            try:
+                self.imap_conn.logout()
+            except Exception:
+                pass
+            self.imap_conn = None
+            self._selected_mbox = None
+            self._idle_supported = None
+
+    def _select(self, imap_conn: imaplib.IMAP4_SSL, mailbox: str) -> None:
+        """SELECT a mailbox only when it isn't already selected."""
+        if self._selected_mbox == mailbox:
+            return
+        imap_conn.select(mailbox)
+        self._selected_mbox = mailbox
+
+    def _ensure_smtp_connection(self) -> Union[smtplib.SMTP_SSL, smtplib.SMTP]:
+        """Ensure we have a valid SMTP connection, reconnecting if necessary.
+
+        Mirrors _ensure_imap_connection so the poll loop's steady-state cost
+        is one NOOP instead of a TLS handshake + LOGIN per cycle.
+        """
+        if self.smtp_conn is not None:
+            try:
+                status, _ = self.smtp_conn.noop()
+                if status == 250:
+                    logger.debug("Using existing SMTP connection")
+                    return self.smtp_conn
+            except Exception as e:
+                logger.warning("Existing SMTP connection is stale: %s", e)
+            # Close the stale connection if possible
+            try:
+                self.smtp_conn.quit()
+            except:
+                pass
+            self.smtp_conn = None
 
-        return imap_conn, smtp_conn
+        self.smtp_conn = self._connect_to_smtp()
+        return self.smtp_conn
 
     def _connect_to_smtp(self) -> Union[smtplib.SMTP_SSL, smtplib.SMTP]:
         """Establish connection to SMTP server only."""
         # Connect to SMTP server with SSL
-        print(f"Connecting to SMTP server {self.smtp_server}:{self.smtp_port}...")
+        logger.info("Connecting to SMTP server %s:%s...", self.smtp_server, self.smtp_port)
 
-        # First, check if we can resolve the hostname
+        # First, check if we can resolve the hostname (cached, so retries
+        # and reconnects skip the lookup)
         try:
-            print(f"Resolving hostname {self.smtp_server}...")
-            socket.gethostbyname(self.smtp_server)
-            print(f"Successfully resolved {self.smtp_server}")
+            logger.debug("Resolving hostname %s...", self.smtp_server)
+            _cached_gethostbyname(self.smtp_server)
+            logger.debug("Successfully resolved %s", self.smtp_server)
         except socket.gaierror as e:
-            print(f"WARNING: Could not resolve hostname {self.smtp_server}: {str(e)}")
+            logger.warning("Could not resolve hostname %s: %s", self.smtp_server, e)
             raise ConnectionError(f"Could not resolve SMTP server hostname: {self.smtp_server}")
 
         context = ssl.create_default_context()
 
-        # Set a timeout for SMTP connections - increase from 30 to 60 seconds
-        socket.setdefaulttimeout(60)  # 60 seconds timeout
+        # The SMTP/SMTP_SSL constructors below each get timeout=60; no
+        # process-wide socket.setdefaulttimeout, which would silently
+        # change every other socket in the process
 
         # For port 587, we should use STARTTLS instead of direct SSL
         if self.smtp_port == 587:
-            print("Port 587 detected, using STARTTLS instead of direct SSL...")
+            logger.debug("Port 587 detected, using STARTTLS instead of direct SSL...")
             try:
                 smtp_conn = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=60)
                 smtp_conn.ehlo()
                 smtp_conn.starttls(context=context)
                 smtp_conn.ehlo()
-                print("Connected to SMTP server using STARTTLS")
+                logger.info("Connected to SMTP server using STARTTLS")
             except Exception as e:
-                print(f"STARTTLS connection failed: {str(e)}")
+                logger.error("STARTTLS connection failed: %s", e)
                 raise ConnectionError(f"Failed to connect to SMTP server using STARTTLS: {str(e)}")
         else:
             # For other ports (like 465), try direct SSL first
             try:
-                print(f"Attempting direct SSL connection to {self.smtp_server}:{self.smtp_port}...")
+                logger.debug("Attempting direct SSL connection to %s:%s...", self.smtp_server, self.smtp_port)
                 smtp_conn = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, context=context, timeout=60)
-                print("Connected to SMTP server using direct SSL")
+                logger.info("Connected to SMTP server using direct SSL")
             except Exception as e:
-                print(f"Direct SSL connection failed: {str(e)}")
-                print("Trying STARTTLS as fallback...")
+                logger.warning("Direct SSL connection failed: %s", e)
+                logger.info("Trying STARTTLS as fallback...")
                 try:
                     smtp_conn = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=60)
                     smtp_conn.ehlo()
                     smtp_conn.starttls(context=context)
                     smtp_conn.ehlo()
-                    print("Connected to SMTP server using STARTTLS")
+                    logger.info("Connected to SMTP server using STARTTLS")
                 except Exception as e2:
-                    print(f"All SMTP connection attempts failed: {str(e2)}")
+                    logger.error("All SMTP connection attempts failed: %s", e2)
                     raise ConnectionError(f"Failed to connect to SMTP server: {str(e2)}")
 
         # Login to SMTP server with the specific SMTP username and password
-        print(f"Logging in to SMTP server as {self.smtp_username}...")
+        logger.debug("Logging in to SMTP server as %s...", self.smtp_username)
         try:
             smtp_conn.login(self.smtp_username, self.smtp_password)
-            print("SMTP login successful!")
+            logger.info("SMTP login successful!")
         except smtplib.SMTPAuthenticationError as e:
-            print(f"SMTP authentication failed: {str(e)}")
-            print("Check your SMTP username and password")
+            logger.error("SMTP authentication failed: %s", e)
             raise smtplib.SMTPAuthenticationError(
                 e.smtp_code,
                 f"SMTP authentication failed. Check your SMTP username ({self.smtp_username}) and password."
@@ -245,37 +426,138 @@ class Emailer:
 
         return smtp_conn
 
+    def _decode_payload(self, payload: bytes, charset: Union[str, None]) -> str:
+        # Decode with the declared charset; never let an unknown charset or
+        # a stray byte throw away the whole message
+        try:
+            return payload.decode(charset or "utf-8", errors="replace")
+        except LookupError:
+            return payload.decode("utf-8", errors="replace")
+
     def _get_body(self, email_message: Message) -> str:
+        # The modern parser locates the preferred text part in one call
+        if isinstance(email_message, EmailMessage):
+            try:
+                part = email_message.get_body(preferencelist=("plain",))
+                if part is not None:
+                    content = part.get_content()
+                    if isinstance(content, str):
+                        return self._strip_replies(content)
+            except Exception as e:
+                logger.warning(
+                    "get_body() failed, falling back to MIME walk: %s", e
+                )
         body: str = ""
         if email_message.is_multipart():
             for part in email_message.walk():
                 if part.get_content_type() == "text/plain":
                     payload = part.get_payload(decode=True)
                     if isinstance(payload, bytes):
-                        body = payload.decode()
+                        body = self._decode_payload(
+                            payload, part.get_content_charset()
+                        )
                     break
         else:
             payload = email_message.get_payload(decode=True)
             if isinstance(payload, bytes):
-                body = payload.decode()
+                body = self._decode_payload(
+                    payload, email_message.get_content_charset()
+                )
             else:
                 body = str(payload)
         return self._strip_replies(body)
 
     def _strip_replies(self, raw_body: str) -> str:
-        lines = raw_body.split("\n")
-        pruned: List[str] = []
-        for line in lines:
-            # Stop if we see a typical reply indicator
-            if line.strip().startswith("On ") and " wrote:" in line:
+        # Single forward scan instead of materializing a list of lines:
+        # slice the body at the first typical reply indicator
+        i = 0
+        while i < len(raw_body):
+            j = raw_body.find("\n", i)
+            end = len(raw_body) if j == -1 else j
+            line = raw_body[i:end]
+            if line.lstrip().startswith("On ") and " wrote:" in line:
+                return raw_body[:i].rstrip()
+            if j == -1:
                 break
-            pruned.append(line)
-        return "\n".join(pruned).strip()
+            i = j + 1
+        return raw_body.strip()
 
     def _parse_email(
         self, imap_conn: imaplib.IMAP4_SSL, email_id: bytes
     ) -> Union[Email, None]:
-        _, msg_data = imap_conn.fetch(email_id.decode(), "(BODY.PEEK[])")
+        uid = email_id.decode()
+        _, msg_data = imap_conn.uid(
+            "FETCH", uid, "(BODY.PEEK[HEADER] BODYSTRUCTURE)"
+        )
+        header_bytes: Union[bytes, None] = None
+        structure_parts: List[str] = []
+        for msg_resp in msg_data or []:
+            if isinstance(msg_resp, tuple) and len(msg_resp) == 2:
+                meta, payload = msg_resp
+                if isinstance(meta, bytes):
+                    structure_parts.append(meta.decode("ascii", "replace"))
+                if isinstance(payload, bytes):
+                    header_bytes = payload
+            elif isinstance(msg_resp, bytes):
+                structure_parts.append(msg_resp.decode("ascii", "replace"))
+        if header_bytes is None:
+            return None
+
+        body = self._fetch_plain_body(imap_conn, uid, " ".join(structure_parts))
+        if body is None:
+            # No parseable text/plain part: fall back to the full message
+            return self._parse_email_full(imap_conn, email_id)
+
+        email_message = _HEADER_PARSER.parsebytes(header_bytes)
+        return self._email_from_message(uid, email_message, body)
+
+    def _fetch_plain_body(
+        self, imap_conn: imaplib.IMAP4_SSL, uid: str, structure_line: str
+    ) -> Union[str, None]:
+        """Fetch only the first text/plain part located via BODYSTRUCTURE."""
+        start = structure_line.find("BODYSTRUCTURE (")
+        if start == -1:
+            return None
+        structure, _ = _parse_imap_list(
+            structure_line, start + len("BODYSTRUCTURE ")
+        )
+        found = _find_plain_part(structure)
+        if not found:
+            return None
+        section, charset, encoding, size = found
+
+        # Partial-fetch oversized parts instead of pulling megabytes of text
+        if size > _MAX_PART_FETCH:
+            fetch_item = f"(BODY.PEEK[{section}]<0.{_MAX_PART_FETCH}>)"
+        else:
+            fetch_item = f"(BODY.PEEK[{section}])"
+        _, body_data = imap_conn.uid("FETCH", uid, fetch_item)
+        payload: Union[bytes, None] = None
+        for msg_resp in body_data or []:
+            if (
+                isinstance(msg_resp, tuple)
+                and len(msg_resp) == 2
+                and isinstance(msg_resp[1], bytes)
+            ):
+                payload = msg_resp[1]
+                break
+        if payload is None:
+            return None
+
+        try:
+            if encoding == "base64":
+                payload = base64.b64decode(payload)
+            elif encoding == "quoted-printable":
+                payload = quopri.decodestring(payload)
+        except Exception as e:
+            logger.warning("Error decoding message part %s: %s", section, e)
+            return None
+        return self._strip_replies(self._decode_payload(payload, charset))
+
+    def _parse_email_full(
+        self, imap_conn: imaplib.IMAP4_SSL, email_id: bytes
+    ) -> Union[Email, None]:
+        _, msg_data = imap_conn.uid("FETCH", email_id.decode(), "(BODY.PEEK[])")
         if not msg_data or not msg_data[0]:
             return None
         msg_resp = msg_data[0]
@@ -284,7 +566,17 @@ class Emailer:
         else:
             return None
 
-        email_message = email.message_from_bytes(email_body)
+        return self._email_from_bytes(email_id.decode(), email_body)
+
+    def _email_from_bytes(self, email_id: str, email_body: bytes) -> Email:
+        email_message = _PARSER.parsebytes(email_body)
+        return self._email_from_message(
+            email_id, email_message, self._get_body(email_message)
+        )
+
+    def _email_from_message(
+        self, email_id: str, email_message: Message, body: str
+    ) -> Email:
         subject = email_message["subject"] or ""
         from_address = parseaddr(email_message.get("From", ""))[1]
         to_address = parseaddr(email_message.get("To", ""))[1]
@@ -292,7 +584,7 @@ class Emailer:
         date = datetime.now()
         if date_str:
             try:
-                date = parsedate_to_datetime(date_str)
+                date = _parse_date(str(date_str))
             except Exception:
                 pass
 
@@ -300,9 +592,8 @@ class Emailer:
         message_id = email_message.get("Message-ID", "")
         references = email_message.get("References", "")
 
-        body = self._get_body(email_message)
         return Email(
-            id=email_id.decode(),
+            id=email_id,
             from_address=from_address,
             to_address=to_address,
             subject=subject,
@@ -312,51 +603,117 @@ class Emailer:
             date=date,
         )
 
+    def _fetch_emails(
+        self,
+        imap_conn: imaplib.IMAP4_SSL,
+        uids: List[str],
+        headers_only: bool = False,
+    ) -> List[Email]:
+        """Fetch several messages with batched UID FETCHes.
+
+        headers_only fetches BODY.PEEK[HEADER] and leaves body empty; it is
+        only suitable for root discovery, where the thread expansion that
+        follows refetches the message with its body. Threads handed to
+        respond() need every member's body: the agent prompt uses the whole
+        thread as context.
+        """
+        fetch_item = "(BODY.PEEK[HEADER])" if headers_only else "(BODY.PEEK[])"
+        emails: List[Email] = []
+        for start in range(0, len(uids), _FETCH_BATCH_SIZE):
+            batch = uids[start:start + _FETCH_BATCH_SIZE]
+            _, msg_data = imap_conn.uid(
+                "FETCH", ",".join(batch), fetch_item
+            )
+            for msg_resp in msg_data or []:
+                if not (isinstance(msg_resp, tuple) and len(msg_resp) == 2):
+                    continue
+                meta, payload = msg_resp
+                if not isinstance(payload, bytes):
+                    continue
+                # The UID of each message is echoed back in the metadata
+                uid_match = _UID_RE.search(meta)
+                uid = uid_match.group(1).decode() if uid_match else ""
+                if headers_only:
+                    email_message = _HEADER_PARSER.parsebytes(payload)
+                    emails.append(
+                        self._email_from_message(uid, email_message, "")
+                    )
+                else:
+                    emails.append(self._email_from_bytes(uid, payload))
+        return emails
+
     def _get_email_thread(
         self, imap_conn: imaplib.IMAP4_SSL, email_id_bytes: bytes
     ) -> List[Email]:
         email = self._parse_email(imap_conn, email_id_bytes)
         if not email:
             return []
+        return self._expand_thread(imap_conn, email)
 
-        thread = [email]
-
-        # Try thread via X-GM-THRID (Gmail extension)
-        _, thrid_data = imap_conn.fetch(email.id, "(X-GM-THRID)")
+    def _expand_thread(
+        self, imap_conn: imaplib.IMAP4_SSL, email: Email
+    ) -> List[Email]:
+        """Expand a message into its full thread, bodies included.
+
+        The expanded thread feeds respond() directly (both here and in
+        main.py's process_with_draft_handling), so every member carries its
+        body; the fetches stay batched.
+        """
+        # Try thread via X-GM-THRID (Gmail extension): one UID SEARCH returns
+        # every message in the thread, one UID FETCH pulls them all at once
+        _, thrid_data = imap_conn.uid("FETCH", email.id, "(X-GM-THRID)")
         match = None
         if thrid_data and thrid_data[0]:
             data = thrid_data[0]
+            if isinstance(data, tuple):
+                data = data[0]
             if isinstance(data, bytes):
-                match = re.search(r"X-GM-THRID\s+(\d+)", data.decode())
-            else:
-                match = re.search(r"X-GM-THRID\s+(\d+)", str(data))
+                match = _THRID_RE.search(data)
         if match:
-            thread_id = match.group(1)
-            _, thread_ids = imap_conn.search(None, f"X-GM-THRID {thread_id}")
+            thread_id = match.group(1).decode()
+            _, thread_ids = imap_conn.uid("SEARCH", None, f"X-GM-THRID {thread_id}")
             if thread_ids and thread_ids[0]:
-                thread = [
-                    self._parse_email(imap_conn, mid) for mid in thread_ids[0].split()
-                ]
-                thread = [e for e in thread if e]
+                uids = [uid.decode() for uid in thread_ids[0].split()]
+                thread = self._fetch_emails(imap_conn, uids)
                 thread.sort(key=lambda e: e.date)
                 return thread
 
-        # Fallback: use REFERENCES header
-        _, ref_data = imap_conn.fetch(
-            email.id, "(BODY.PEEK[HEADER.FIELDS (REFERENCES)])"
+        # Roots arrive headers-only from batch discovery; hydrate the body
+        # (targeted text/plain fetch) before building the thread around it
+        if not email.body and email.id:
+            hydrated = self._parse_email(imap_conn, email.id.encode())
+            if hydrated:
+                email = hydrated
+        thread = [email]
+
+        # Fallback: use REFERENCES header with a single OR-chained UID SEARCH
+        # instead of one SEARCH round trip per referenced Message-ID
+        _, ref_data = imap_conn.uid(
+            "FETCH", email.id, "(BODY.PEEK[HEADER.FIELDS (REFERENCES)])"
         )
         if ref_data and ref_data[0]:
             ref_line = (
                 ref_data[0][1].decode() if isinstance(ref_data[0][1], bytes) else ""
             )
-            refs = re.findall(r"<([^>]+)>", ref_line)
-            for ref in refs:
-                _, ref_ids = imap_conn.search(None, f'(HEADER Message-ID "<{ref}>")')
+            # References headers commonly repeat Message-IDs; dedupe before
+            # building the search criteria
+            refs = list(dict.fromkeys(_ANGLE_ID_RE.findall(ref_line)))
+            if refs:
+                # IMAP SEARCH OR is binary, so fold the criteria left
+                criteria = f'HEADER Message-ID "<{refs[0]}>"'
+                for ref in refs[1:]:
+                    criteria = f'OR ({criteria}) (HEADER Message-ID "<{ref}>")'
+                _, ref_ids = imap_conn.uid("SEARCH", None, f"({criteria})")
                 if ref_ids and ref_ids[0]:
-                    for ref_id in ref_ids[0].split():
-                        ref_email = self._parse_email(imap_conn, ref_id)
-                        if ref_email and ref_email.id not in [e.id for e in thread]:
-                            thread.append(ref_email)
+                    # O(1) membership checks instead of rescanning the thread
+                    seen_ids = {email.id}
+                    uids: List[str] = []
+                    for uid_bytes in ref_ids[0].split():
+                        uid = uid_bytes.decode()
+                        if uid not in seen_ids:
+                            seen_ids.add(uid)
+                            uids.append(uid)
+                    thread.extend(self._fetch_emails(imap_conn, uids))
 
             # Sort emails in the thread by date (ascending order)
             thread.sort(key=lambda e: e.date)
@@ -365,30 +722,106 @@ class Emailer:
         return thread
 
     def _get_unread_emails(self, imap_conn: imaplib.IMAP4_SSL) -> List[List[Email]]:
-        imap_conn.select("INBOX")
-        _, msg_nums = imap_conn.search(None, f'(UNSEEN TO "{self.support_address}")')
-        emails: List[List[Email]] = []
+        with self._imap_lock:
+            self._select(imap_conn, "INBOX")
+            _, msg_nums = imap_conn.uid(
+                "SEARCH", None, f'(UNSEEN TO "{self.support_address}")'
+            )
+            if not msg_nums or not msg_nums[0]:
+                return []
 
-        for email_id in msg_nums[0].split():
-            thread = self._get_email_thread(imap_conn, email_id)
-            emails.append(thread)
+            # One headers-only batch fetch discovers every unread root
+            # before any thread expansion, instead of one FETCH round trip
+            # per message; _expand_thread refetches messages with bodies
+            uids = [uid.decode() for uid in msg_nums[0].split()]
+            roots = self._fetch_emails(imap_conn, uids, headers_only=True)
 
-        return emails
+            return [self._expand_thread(imap_conn, root) for root in roots]
 
     def mark_as_read(self, imap_conn: imaplib.IMAP4_SSL, message_id: str):
-        imap_conn.store(message_id, "+FLAGS", "\\Seen")
+        # message_id may be a single UID or a comma-separated UID set;
+        # callers batch their ids so K emails cost one STORE round trip
+        with self._imap_lock:
+            imap_conn.uid("STORE", message_id, "+FLAGS", "\\Seen")
+
+    def _supports_idle(self, imap_conn: imaplib.IMAP4_SSL) -> bool:
+        """Check (once per connection) whether the server advertises IDLE."""
+        if self._idle_supported is None:
+            capabilities = imap_conn.capabilities
+            self._idle_supported = (
+                "IDLE" in capabilities or b"IDLE" in capabilities
+            )
+            if not self._idle_supported:
+                logger.info("Server does not advertise IDLE, polling instead")
+        return self._idle_supported
+
+    def idle_wait(self, imap_conn: imaplib.IMAP4_SSL, timeout: int) -> bool:
+        """IDLE in short slices, releasing the IMAP lock between slices so
+        concurrent workers (mark-as-read, draft saves) aren't starved for
+        the whole IDLE window."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            with self._imap_lock:
+                if self._idle_wait(imap_conn, min(60, max(1, int(remaining)))):
+                    return True
+
+    def find_drafts_folder(self, imap_conn: imaplib.IMAP4_SSL) -> str:
+        """Locate the Drafts mailbox once via LIST (RFC 6154 \\Drafts flag)
+        and cache it, instead of probing folder names on every draft."""
+        if self.drafts_folder is not None:
+            return self.drafts_folder
+
+        try:
+            _, mailboxes = imap_conn.list()
+            for raw in mailboxes or []:
+                if not isinstance(raw, bytes):
+                    continue
+                match = _LIST_RE.match(raw.decode("ascii", "replace"))
+                if match and "\\Drafts" in match.group("flags"):
+                    name = match.group("name").strip()
+                    if not name.startswith('"'):
+                        name = f'"{name}"'
+                    self.drafts_folder = name
+                    logger.info("Drafts folder detected: %s", name)
+                    return name
+        except Exception as e:
+            logger.warning("Could not detect Drafts folder via LIST: %s", e)
+
+        # Sensible default for the Gmail deployments this targets
+        self.drafts_folder = '"[Gmail]/Drafts"'
+        return self.drafts_folder
+
+    def send_reply(self, response: Email) -> None:
+        """Send a reply over the persistent SMTP connection.
+
+        Amortizes the TCP+STARTTLS+AUTH handshake across sends instead of
+        reconnecting per message; reconnects once on a dead socket.
+        """
+        message = response.to_message(self.support_address)
+        with self._smtp_lock:
+            smtp_conn = self._ensure_smtp_connection()
+            try:
+                smtp_conn.send_message(message)
+            except (smtplib.SMTPServerDisconnected, ConnectionResetError):
+                logger.warning("SMTP connection lost, reconnecting...")
+                smtp_conn = self._ensure_smtp_connection()
+                smtp_conn.send_message(message)
 
     def get_email_thread(self, email_id: str) -> List[Email]:
         # Get IMAP connection
         imap_conn = self._ensure_imap_connection()
 
-        # Make sure we're in the INBOX
-        imap_conn.select("INBOX")
+        with self._imap_lock:
+            # Make sure we're in the INBOX
+            self._select(imap_conn, "INBOX")
 
-        # Get the thread
-        thread = self._get_email_thread(
-            imap_conn=imap_conn, email_id_bytes=email_id.encode()
-        )
+            # Get the thread
+            thread = self._get_email_thread(
+                imap_conn=imap_conn, email_id_bytes=email_id.encode()
+            )
 
         return thread
 
@@ -398,33 +831,65 @@ class Emailer:
         mark_read: bool = True,
     ):
         try:
-            # Get IMAP connection
-            imap_conn = self._ensure_imap_connection()
-
-            # Get unread emails
-            print("Fetching unread emails...")
-            unread_emails = self._get_unread_emails(imap_conn)
+            # Get IMAP connection. The blocking imaplib/smtplib calls below
+            # all run via asyncio.to_thread so the event loop stays free for
+            # other tasks; commands stay serialized because they share one
+            # IMAP connection.
+            imap_conn = await asyncio.to_thread(self._ensure_imap_connection)
+
+            # Get unread emails, retrying once on a dead cached connection
+            # (the connection is validated lazily instead of with a NOOP)
+            logger.debug("Fetching unread emails...")
+            try:
+                unread_emails = await asyncio.to_thread(
+                    self._get_unread_emails, imap_conn
+                )
+            except (imaplib.IMAP4.abort, OSError) as e:
+                logger.warning("IMAP connection dropped, reconnecting: %s", e)
+                await asyncio.to_thread(self._drop_imap_connection)
+                imap_conn = await asyncio.to_thread(
+                    self._ensure_imap_connection
+                )
+                unread_emails = await asyncio.to_thread(
+                    self._get_unread_emails, imap_conn
+                )
 
             # Only connect to SMTP if there are unread emails
             if not unread_emails:
-                print("No unread emails found, skipping SMTP connection")
+                logger.debug("No unread emails found, skipping SMTP connection")
                 return
 
             # Connect to SMTP server only if we have emails to respond to
-            print("Unread emails found, connecting to SMTP server...")
+            logger.info("Unread emails found, connecting to SMTP server...")
             try:
-                smtp_conn = self._connect_to_smtp()
+                smtp_conn = await asyncio.to_thread(self._ensure_smtp_connection)
             except Exception as e:
-                print(f"Failed to connect to SMTP server: {str(e)}")
+                logger.error("Failed to connect to SMTP server: %s", e)
                 return
 
-            for email_thread in unread_emails:
-                # Get the most recent email in the thread
+            # Generate all responses concurrently and send each reply as its
+            # generation completes, so one thread's respond() (typically an
+            # LLM call) overlaps the previous thread's SMTP send
+            async def respond_to(
+                email_thread: List[Email],
+            ) -> Tuple[List[Email], Union[Email, None]]:
+                return email_thread, await respond(email_thread)
+
+            pending = [
+                asyncio.create_task(respond_to(t)) for t in unread_emails if t
+            ]
+
+            to_mark: List[str] = []
+            for future in asyncio.as_completed(pending):
+                # One failing respond() must not abort the rest of the batch
+                # (or leak its still-running sibling tasks)
+                try:
+                    email_thread, response = await future
+                except Exception as e:
+                    logger.error("Error generating response: %s", e)
+                    continue
                 most_recent = email_thread[-1]
 
-                # Generate the response
-                response = await respond(email_thread)
-
                 # If there is no response, skip this email and keep as unread
                 # in the inbox
                 if response is None:
@@ -432,9 +897,13 @@ class Emailer:
 
                 # Send the response
                 # Get the most recent email in the thread to reply to
-                print(
-                    f"Replying to '{response.to_address}' from '{self.email_address}':\n  {json.dumps(response.body)}"
-                )
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(
+                        "Replying to %r from %r: %s",
+                        response.to_address,
+                        self.email_address,
+                        json.dumps(response.body),
+                    )
 
                 # Set the message_id and references from the original email for proper threading
                 response.message_id = most_recent.message_id
@@ -450,61 +919,96 @@ class Emailer:
 
                 for attempt in range(1, max_retries + 1):
                     try:
-                        # Make sure the connection is still alive
-                        try:
-                            smtp_conn.noop()
-                        except:
-                            print(f"SMTP connection lost, reconnecting (attempt {attempt})...")
-                            smtp_conn = self._connect_to_smtp()
-
-                        # Send the message with a larger data block size
-                        smtp_conn.send_message(message)
-                        print(f"Email sent successfully with headers: From={message['From']}, To={message['To']}, CC={message['Cc']}")
+                        # Send directly; a dead connection surfaces as
+                        # SMTPServerDisconnected below, so the happy path
+                        # pays no liveness-check round trip
+                        await asyncio.to_thread(smtp_conn.send_message, message)
+                        logger.info("Email sent successfully with headers: From=%s, To=%s, CC=%s", message["From"], message["To"], message["Cc"])
                         success = True
                         break
-                    except smtplib.SMTPServerDisconnected:
-                        print(f"SMTP server disconnected, reconnecting (attempt {attempt})...")
-                        smtp_conn = self._connect_to_smtp()
+                    except (smtplib.SMTPServerDisconnected, ConnectionResetError):
+                        logger.warning("SMTP server disconnected, reconnecting (attempt %s)...", attempt)
+                        smtp_conn = await asyncio.to_thread(self._ensure_smtp_connection)
                     except smtplib.SMTPResponseException as e:
                         if e.smtp_code == 451:  # Timeout error
-                            print(f"SMTP timeout error (451), retrying in {retry_delay}s (attempt {attempt})...")
+                            logger.warning("SMTP timeout error (451), retrying in %ss (attempt %s)...", retry_delay, attempt)
                             await asyncio.sleep(retry_delay)
                             retry_delay *= 2  # Exponential backoff
                             # Reconnect to SMTP server
-                            smtp_conn = self._connect_to_smtp()
+                            smtp_conn = await asyncio.to_thread(self._ensure_smtp_connection)
                         else:
-                            print(f"SMTP error: {e.smtp_code} {e.smtp_error}, retrying in {retry_delay}s (attempt {attempt})...")
+                            logger.warning("SMTP error: %s %s, retrying in %ss (attempt %s)...", e.smtp_code, e.smtp_error, retry_delay, attempt)
                             await asyncio.sleep(retry_delay)
                             retry_delay *= 2
                     except Exception as e:
-                        print(f"Error sending email (attempt {attempt}): {str(e)}")
+                        logger.error("Error sending email (attempt %s): %s", attempt, e)
                         await asyncio.sleep(retry_delay)
                         retry_delay *= 2
 
                 # Skip marking as read if sending failed
                 if not success:
-                    print(f"Failed to send email after {max_retries} attempts, skipping this message")
+                    logger.error("Failed to send email after %s attempts, skipping this message", max_retries)
                     continue
 
-                # Mark the original email as read
-                if mark_read:
-                    self.mark_as_read(imap_conn, most_recent.id)
+                # Queue the original email to be marked read below
+                if mark_read and most_recent.id:
+                    to_mark.append(most_recent.id)
 
-            # Close SMTP connection
-            try:
-                smtp_conn.quit()
-            except:
-                print("Error when closing SMTP connection, ignoring")
+            # Coalesce all flag updates into a single UID STORE round trip
+            if to_mark:
+                await asyncio.to_thread(
+                    self.mark_as_read, imap_conn, ",".join(to_mark)
+                )
+
+            # Keep the SMTP connection alive for the next process() cycle;
+            # run() closes it on shutdown
 
         except Exception as e:
-            print(f"Error during email processing: {str(e)}")
+            logger.error("Error during email processing: %s", e)
             # Reset IMAP connection on error
-            if self.imap_conn:
-                try:
-                    self.imap_conn.logout()
-                except:
-                    pass
-                self.imap_conn = None
+            self._drop_imap_connection()
+
+    def _idle_wait(self, imap_conn: imaplib.IMAP4_SSL, timeout: int) -> bool:
+        """Block inside IMAP IDLE (RFC 2177) until the server pushes a
+        mailbox change, so new mail is picked up immediately instead of on
+        the next poll.
+
+        Returns True when an untagged EXISTS/RECENT arrived, False on
+        timeout. Raises when the connection dies so the caller reconnects.
+        Callers gate on _supports_idle first.
+        """
+        tag = imap_conn._new_tag()  # pyright: ignore[reportPrivateUsage]
+        imap_conn.send(b"%s IDLE\r\n" % tag)
+        sock = imap_conn.socket()
+        old_timeout = sock.gettimeout()
+        sock.settimeout(timeout)
+        got_update = False
+        try:
+            # The server acknowledges with a '+ idling' continuation first
+            while True:
+                line = imap_conn.readline().strip()
+                if not line:
+                    raise imaplib.IMAP4.abort("connection closed during IDLE")
+                if line.startswith(b"+"):
+                    break
+            try:
+                line = imap_conn.readline().strip()
+                if b"EXISTS" in line or b"RECENT" in line:
+                    got_update = True
+            except (socket.timeout, TimeoutError):
+                pass
+        finally:
+            sock.settimeout(old_timeout)
+            try:
+                imap_conn.send(b"DONE\r\n")
+                # Drain until the tagged completion of the IDLE command
+                while True:
+                    line = imap_conn.readline()
+                    if not line or line.startswith(tag):
+                        break
+            except Exception:
+                pass
+        return got_update
 
     async def run(
         self,
@@ -516,15 +1020,39 @@ class Emailer:
             while True:
                 # Process emails
                 await self.process(respond, mark_read)
-                # Wait before next check
-                print(f"Sleeping for {delay}s...")
-                await asyncio.sleep(delay)
+                # Wait for the server to push new mail instead of burning a
+                # SEARCH round trip every `delay` seconds. Servers without
+                # IDLE just sleep — the healthy connection is kept; only an
+                # actual IDLE failure drops it for a reconnect.
+                try:
+                    imap_conn = await asyncio.to_thread(
+                        self._ensure_imap_connection
+                    )
+                    if self._supports_idle(imap_conn):
+                        logger.debug("Waiting for new mail (IMAP IDLE)...")
+                        await asyncio.to_thread(
+                            self.idle_wait, imap_conn, _IDLE_TIMEOUT
+                        )
+                    else:
+                        logger.debug("Sleeping for %ss...", delay)
+                        await asyncio.sleep(delay)
+                except Exception as e:
+                    logger.info("IMAP IDLE failed (%s), reconnecting; sleeping for %ss...", e, delay)
+                    await asyncio.to_thread(self._drop_imap_connection)
+                    await asyncio.sleep(delay)
         finally:
-            # Ensure we close the IMAP connection when the program exits
+            # Ensure we close the connections when the program exits
+            if self.smtp_conn:
+                try:
+                    self.smtp_conn.quit()
+                    logger.info("SMTP connection closed")
+                except:
+                    pass
+                self.smtp_conn = None
             if self.imap_conn:
                 try:
                     self.imap_conn.logout()
-                    print("IMAP connection closed")
+                    logger.info("IMAP connection closed")
                 except:
                     pass
                 self.imap_conn = None
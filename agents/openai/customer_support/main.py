@@ -1,6 +1,9 @@
 import env
 import asyncio
+import functools
+import logging
 from emailer import Emailer, Email
+from semantic_cache import SemanticCache
 from telegram_bot import TelegramBot
 from typing import Union, List, Callable, Awaitable
 import support_agent
@@ -25,6 +28,8 @@ from agents import (
 )
 
 
+logger = logging.getLogger(__name__)
+
 env.ensure("STRIPE_SECRET_KEY")
 env.ensure("OPENAI_API_KEY")
 
@@ -40,22 +45,22 @@ smtp_port = int(os.getenv("SMTP_PORT", "587")) if os.getenv("SMTP_PORT") else No
 smtp_username = os.getenv("SMTP_USERNAME", email_address)  # Default to email_address if not provided
 smtp_password = os.getenv("SMTP_PASSWORD", email_password)  # Default to email_password if not provided
 
-# Print SMTP configuration for debugging
-print("\n=== SMTP Configuration ===")
-print(f"SMTP Server: {smtp_server}")
-print(f"SMTP Port: {smtp_port}")
-print(f"SMTP Username: {smtp_username}")
-print(f"SMTP Password: {'*' * len(smtp_password) if smtp_password else 'None'}")
+# Log SMTP configuration for debugging
+logger.info(
+    "SMTP configuration: server=%s port=%s username=%s password=%s",
+    smtp_server,
+    smtp_port,
+    smtp_username,
+    '*' * len(smtp_password) if smtp_password else 'None',
+)
 
 # Try to resolve the SMTP server hostname
 if smtp_server:
     try:
-        print(f"Resolving {smtp_server}...")
         ip_address = socket.gethostbyname(smtp_server)
-        print(f"Resolved {smtp_server} to {ip_address}")
+        logger.info("Resolved %s to %s", smtp_server, ip_address)
     except socket.gaierror as e:
-        print(f"WARNING: Could not resolve {smtp_server}: {e}")
-print("===========================\n")
+        logger.warning("Could not resolve %s: %s", smtp_server, e)
 
 # Initialize the emailer with SMTP settings from environment variables
 emailer = Emailer(
@@ -72,83 +77,163 @@ emailer = Emailer(
 telegram_bot = None
 try:
     telegram_bot = TelegramBot.from_env()
-    print("\n=== Telegram Bot Configuration ===")
-    print("Telegram Bot initialized successfully")
-    print("===========================\n")
+    logger.info("Telegram Bot initialized successfully")
 except ValueError as e:
-    print(f"\n=== Telegram Bot Configuration ===")
-    print(f"Telegram Bot initialization failed: {e}")
-    print(f"Telegram notifications will be disabled")
-    print("===========================\n")
+    logger.warning(
+        "Telegram Bot initialization failed (%s), notifications disabled", e
+    )
 
-# Add a global set to track processed email IDs
-processed_email_ids = set()
+active_tasks = {}  # { email_id: asyncio.Task }
 
-# Replace with a more sophisticated tracking system
-# Format: {email_id: {'thread_length': length, 'timestamp': time}}
-processed_threads = {}
+# Debounce window for repeated messages in the same thread: when a sender
+# pings twice in quick succession, the second message is left unread for a
+# later cycle so both coalesce into one handler run (one LLM call, one
+# Telegram notification) instead of two
+_recent_threads = {}  # { (from_address, thread_root_id): monotonic ts }
+_DEBOUNCE_SECONDS = 60.0
+
+# Cap concurrent thread handlers so a large unread backlog can't fire
+# hundreds of simultaneous LLM calls and trip provider rate limits
+thread_semaphore = asyncio.Semaphore(int(os.getenv("MAX_CONCURRENT_THREADS", "8")))
+
+# Reuse previously generated replies for near-duplicate questions instead of
+# re-running the agent
+semantic_cache = SemanticCache()
+
+# Fixed per-email template; see respond() for why this must stay stable
+EMAIL_TEMPLATE = (
+    "Email from: {from_address}\n"
+    "To: {to_address}\n"
+    "Subject: {subject}\n\n"
+    "{body}"
+)
+
+# Formatted history blocks keyed by the thread root's Message-ID, so
+# successive replies in the same thread only format the new email
+_thread_prefix_cache = {}
+_THREAD_PREFIX_CACHE_MAX = 500
+
+
+# One compiled alternation instead of five substring scans per response
+_UNSURE_RE = re.compile(r"not sure|unsure|don'?t know|do not know")
 
-active_tasks = {}  # { email_id: asyncio.Task }
 
 def unsure(str: str) -> bool:
-    return (
-        "not sure" in str
-        or "unsure" in str
-        or "don't know" in str
-        or "dont know" in str
-        or "do not know" in str
-    )
+    return _UNSURE_RE.search(str) is not None
+
+
+@functools.lru_cache(maxsize=512)
+def _md_to_html(body_md: str) -> str:
+    # Pure-CPU rendering; memoized because semantic-cache hits resend the
+    # same markdown, and always run via asyncio.to_thread to keep the event
+    # loop responsive on long replies
+    return markdown.markdown(body_md, extensions=["tables"])
 
 
 async def respond(thread: List[Email]) -> Union[Email, None]:
     most_recent = thread[-1]
-    print(f"Got unread email:\n  {json.dumps(most_recent.to_dict())}")
+    # Identifiers only: serializing the whole email (body included) just
+    # for a log line doubles the per-email working set
+    logger.info(
+        "Got unread email id=%s subject=%r from=%s",
+        most_recent.id,
+        most_recent.subject,
+        most_recent.from_address,
+    )
+
+    # Loop through the entire thread to add historical context for the agent.
+    # Every email uses the same fixed template so the request prefix stays
+    # byte-identical as a thread grows — a new reply only appends messages,
+    # which lets OpenAI's automatic prompt caching reuse the shared prefix.
+    # Reuse the already-formatted history blocks for this thread and only
+    # format the emails that arrived since the previous reply
+    root_key = thread[0].message_id or thread[0].id
+    cached_prefix = _thread_prefix_cache.get(root_key)
 
-    # Loop through the entire thread to add historical context for the agent
     input_items: list[TResponseInputItem] = []
-    for email in thread:
-        input_items.append(
-            {
-                "content": (
-                    "This is an earlier email:"
-                    f"Email from: {email.from_address}\n"
-                    f"To: {email.to_address}\n"
-                    f"Subject: {email.subject}\n\n"
-                    f"{email.body}"
-                ),
-                "role": "user",
-            }
-        )
+    if cached_prefix and len(cached_prefix) <= len(thread):
+        input_items.extend(cached_prefix)
+        remaining = thread[len(cached_prefix):]
+    else:
+        remaining = thread
+
+    input_items.extend(
+        {
+            "content": EMAIL_TEMPLATE.format(
+                from_address=email.from_address,
+                to_address=email.to_address,
+                subject=email.subject,
+                body=email.body,
+            ),
+            "role": "user",
+        }
+        for email in remaining
+    )
+
+    # Remember the blocks for the next reply in this thread
+    if root_key:
+        if len(_thread_prefix_cache) >= _THREAD_PREFIX_CACHE_MAX:
+            _thread_prefix_cache.pop(next(iter(_thread_prefix_cache)))
+        _thread_prefix_cache[root_key] = list(input_items)
 
     input_items.append(
         {
             "content": (
-                "This the latest email"
-                "You can use context from earlier emails"
-                "but reply specifically to the following email:"
-                f"Email from: {most_recent.from_address}\n"
-                f"To: {most_recent.to_address}\n"
-                f"Subject: {most_recent.subject}\n\n"
-                f"{most_recent.body}"
+                "The messages above are the email thread, oldest first. "
+                "Use the earlier emails as context, but reply specifically "
+                "to the latest email."
             ),
             "role": "user",
         }
     )
 
-    print(f"Sending to agent:\n  {json.dumps(input_items)}")
+    # Serializing the full input list is only worth it when someone is
+    # actually reading DEBUG logs
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Sending to agent: %s", json.dumps(input_items))
 
-    output = await support_agent.run(input_items)
-    body_md = ItemHelpers.text_message_outputs(output.new_items)
+    # Check the semantic cache first; a close-enough earlier question means
+    # we can skip the agent run entirely. Fail open on any cache error.
+    cached_md = None
+    embedding = None
+    try:
+        cached_md, embedding = await semantic_cache.lookup(most_recent.body)
+    except Exception as e:
+        logger.warning("Semantic cache lookup failed, running agent: %s", e)
+
+    if cached_md is not None:
+        logger.info("Semantic cache hit, reusing previous response")
+        body_md = cached_md
+    else:
+        # Stream the generation; when Telegram is configured, a live
+        # "drafting..." preview hides the generation latency behind I/O the
+        # operator is already watching
+        preview = None
+        if telegram_bot:
+            preview = await telegram_bot.start_draft_preview(most_recent)
+        try:
+            output = await support_agent.run_streamed(
+                input_items, preview.on_delta if preview else None
+            )
+            body_md = ItemHelpers.text_message_outputs(output.new_items)
+        finally:
+            if preview:
+                await preview.finish()
 
     # Handle answers that the agent doesn't know
     if unsure(body_md.lower()):
-        print(
-            f"Agent doesn't know, ignore response and keep email in the inbox:\n{body_md}"
+        logger.info(
+            "Agent doesn't know, ignoring response and keeping email %s in the inbox",
+            most_recent.id,
         )
         return None
 
+    # Remember this answer for future near-duplicate questions
+    if cached_md is None and embedding is not None:
+        semantic_cache.store(embedding, body_md)
+
     # OpenAI often returns the body in html fences, trim those
-    body_html = markdown.markdown(body_md, extensions=["tables"])
+    body_html = await asyncio.to_thread(_md_to_html, body_md)
 
     # Create draft email response
     draft_email = Email(
@@ -158,23 +243,27 @@ async def respond(thread: List[Email]) -> Union[Email, None]:
         body=body_html,
     )
 
-    print(f"DEBUG: telegram_bot is {'available' if telegram_bot else 'None'}")
+    logger.debug("telegram_bot is %s", "available" if telegram_bot else "None")
 
     # If Telegram bot is available, send notification and wait for action
     if telegram_bot:
         try:
-            print("Sending notification to Telegram and waiting for approval...")
-            print(f"DEBUG: thread length: {len(thread)}, most recent subject: {most_recent.subject}")
-            print(f"DEBUG: draft_email subject: {draft_email.subject}, length: {len(draft_email.body)}")
+            logger.info("Sending notification to Telegram and waiting for approval...")
+            logger.debug(
+                "thread length: %s, most recent subject: %r, draft length: %s",
+                len(thread),
+                most_recent.subject,
+                len(draft_email.body),
+            )
 
             result = await telegram_bot.notify_and_wait_for_action(thread, draft_email)
-            print(f"DEBUG: Received result from notify_and_wait_for_action: {result is not None}")
+            logger.debug("Received result from notify_and_wait_for_action: %s", result is not None)
 
             if result is not None:
-                print("Telegram user approved sending the email")
+                logger.info("Telegram user approved sending the email")
                 return result
             else:
-                print("Telegram user chose to save as draft or timeout occurred")
+                logger.info("Telegram user chose to save as draft or timeout occurred")
                 # Create a draft email in Gmail
                 await save_draft(draft_email, most_recent)
                 # Return a special marker object indicating we created a draft and should keep as unread
@@ -188,22 +277,20 @@ async def respond(thread: List[Email]) -> Union[Email, None]:
                 return draft_marker
 
         except Exception as e:
-            print(f"Error sending Telegram notification: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.error("Error sending Telegram notification: %s", e, exc_info=True)
             # Fall back to sending email directly if Telegram fails
-            print("Falling back to sending email directly without Telegram notification")
+            logger.info("Falling back to sending email directly without Telegram notification")
             return draft_email
     else:
         # No Telegram bot available, return draft email for sending
-        print("DEBUG: No Telegram bot available, sending email directly")
+        logger.debug("No Telegram bot available, sending email directly")
         return draft_email
 
 
 async def save_draft(draft_email: Email, original_email: Email):
     """Save the draft email in Gmail without sending it."""
     try:
-        print(f"Saving draft for email from {original_email.from_address} with subject: {original_email.subject}")
+        logger.info("Saving draft for email from %s with subject: %r", original_email.from_address, original_email.subject)
 
         # Create the email message
         message = draft_email.to_message(original_email.message_id)
@@ -211,27 +298,36 @@ async def save_draft(draft_email: Email, original_email: Email):
         # Convert the message to a string
         email_str = message.as_string()
 
+        # The select/append sequence is blocking socket I/O; run it in a
+        # worker thread so Telegram callbacks stay responsive
+        await asyncio.to_thread(_append_draft, email_str)
+
+    except Exception as e:
+        logger.error("Error saving draft: %s", e, exc_info=True)
+
+
+def _append_draft(email_str: str):
+    """Blocking IMAP portion of save_draft; runs via asyncio.to_thread."""
+    with emailer._imap_lock:
+        _append_draft_locked(email_str)
+
+
+def _append_draft_locked(email_str: str):
+    try:
         # Connect to IMAP
         imap_conn = emailer._ensure_imap_connection()
 
-        # Select the drafts folder (for Gmail it's typically "[Gmail]/Drafts")
-        drafts_folder = '"[Gmail]/Drafts"'  # Default drafts folder
+        # The Drafts folder is detected once via LIST and cached on the
+        # emailer, instead of probing up to four folder names per draft
+        drafts_folder = emailer.find_drafts_folder(imap_conn)
         try:
-            # Try standard Gmail draft folder
             result, data = imap_conn.select(drafts_folder)
             if result != 'OK':
-                # Try alternative names for the drafts folder
-                drafts_folder = '"Drafts"'
-                result, data = imap_conn.select(drafts_folder)
-                if result != 'OK':
-                    drafts_folder = '"[Google Mail]/Drafts"'
-                    result, data = imap_conn.select(drafts_folder)
-                    if result != 'OK':
-                        print("Could not find Drafts folder, using INBOX instead")
-                        drafts_folder = 'INBOX'
-                        imap_conn.select(drafts_folder)
+                logger.warning("Could not select Drafts folder, using INBOX instead")
+                drafts_folder = 'INBOX'
+                imap_conn.select(drafts_folder)
         except Exception as e:
-            print(f"Error selecting drafts folder: {e}, using INBOX instead")
+            logger.warning("Error selecting drafts folder: %s, using INBOX instead", e)
             drafts_folder = 'INBOX'
             imap_conn.select(drafts_folder)
 
@@ -245,42 +341,43 @@ async def save_draft(draft_email: Email, original_email: Email):
         )
 
         if result == 'OK':
-            print(f"Draft saved successfully to {drafts_folder}")
+            logger.info("Draft saved successfully to %s", drafts_folder)
         else:
-            print(f"Failed to save draft: {result} - {data}")
+            logger.error("Failed to save draft: %s - %s", result, data)
 
-    except Exception as e:
-        print(f"Error saving draft: {e}")
-        import traceback
-        traceback.print_exc()
+    finally:
+        # Re-select INBOX and refresh the emailer's mailbox cache, since the
+        # drafts-folder SELECTs above bypassed Emailer._select
+        try:
+            imap_conn = emailer._ensure_imap_connection()
+            imap_conn.select("INBOX")
+            emailer._selected_mbox = "INBOX"
+        except Exception:
+            pass
 
 
 async def handle_thread(emailer, respond, imap_conn, email_thread):
-    global active_tasks
     most_recent = email_thread[-1]
-    email_id = most_recent.id
 
     try:
-        # Generate the response (this calls notify_and_wait_for_action in the Telegram bot)
-        response = await respond(email_thread)
-        if response is None or response.id == "DRAFT_MARKER":
-            print(f"[handle_thread] Draft saved. Email {most_recent.id} remains unread.")
-        else:
-            print(f"[handle_thread] Sending an email response to {response.to_address}...")
-            smtp_conn = emailer._connect_to_smtp()
-            message = response.to_message(emailer.support_address)
-            smtp_conn.send_message(message)
-            smtp_conn.quit()
+        async with thread_semaphore:
+            # Generate the response (this calls notify_and_wait_for_action in the Telegram bot)
+            response = await respond(email_thread)
+            if response is None or response.id == "DRAFT_MARKER":
+                logger.info("[handle_thread] Draft saved. Email %s remains unread.", most_recent.id)
+            else:
+                logger.info("[handle_thread] Sending an email response to %s...", response.to_address)
+                # Reuses the emailer's persistent SMTP connection instead of
+                # a connect/quit handshake per message
+                await asyncio.to_thread(emailer.send_reply, response)
 
-            emailer.mark_as_read(imap_conn, most_recent.id)
-            print(f"[handle_thread] Marked email {most_recent.id} as read.")
+                await asyncio.to_thread(
+                    emailer.mark_as_read, imap_conn, most_recent.id
+                )
+                logger.info("[handle_thread] Marked email %s as read.", most_recent.id)
 
     except Exception as e:
-        print(f"[handle_thread] Error handling thread for email {most_recent.id}: {e}")
-    finally:
-        # Important: remove from active_tasks so future messages in this thread can spawn new tasks
-        active_tasks.pop(email_id, None)
-        print(f"[handle_thread] Finished email thread {email_id}, removed task from active_tasks.")
+        logger.error("[handle_thread] Error handling thread for email %s: %s", most_recent.id, e)
 
 
 async def process_with_draft_handling(emailer, respond):
@@ -288,11 +385,13 @@ async def process_with_draft_handling(emailer, respond):
     Process emails in parallel, so we don't block on older emails
     while waiting for Telegram responses.
     """
-    imap_conn = emailer._ensure_imap_connection()
-    unread_threads = emailer._get_unread_emails(imap_conn)
+    # Blocking IMAP calls run off the event loop so in-flight handler tasks
+    # (and Telegram callbacks) keep making progress
+    imap_conn = await asyncio.to_thread(emailer._ensure_imap_connection)
+    unread_threads = await asyncio.to_thread(emailer._get_unread_emails, imap_conn)
 
     if not unread_threads:
-        print("[process_with_draft_handling] No unread emails found.")
+        logger.debug("[process_with_draft_handling] No unread emails found.")
         return
 
     # For each unread thread, spawn a new task if not already present
@@ -305,10 +404,27 @@ async def process_with_draft_handling(emailer, respond):
         if email_id in active_tasks:
             continue
 
-        # Create a new task
+        # Debounce duplicate senders in the same thread; the message stays
+        # unread, so the next poll picks it up merged into its thread
+        root_key = (most_recent.from_address, thread[0].message_id or thread[0].id)
+        now = time.monotonic()
+        if now - _recent_threads.get(root_key, 0.0) < _DEBOUNCE_SECONDS:
+            logger.info("[process_with_draft_handling] Debouncing thread from %s, coalescing on a later cycle", most_recent.from_address)
+            continue
+        if len(_recent_threads) > 1000:
+            for key, ts in list(_recent_threads.items()):
+                if now - ts >= _DEBOUNCE_SECONDS:
+                    _recent_threads.pop(key, None)
+        _recent_threads[root_key] = now
+
+        # Create a new task. The done-callback reaps the entry however the
+        # task ends (return, exception, or cancellation), so future messages
+        # in this thread can spawn new tasks and the dict can't grow
+        # unboundedly.
         t = asyncio.create_task(handle_thread(emailer, respond, imap_conn, thread))
+        t.add_done_callback(lambda _t, key=email_id: active_tasks.pop(key, None))
         active_tasks[email_id] = t
-        print(f"[process_with_draft_handling] Spawned async task for email ID {email_id}")
+        logger.info("[process_with_draft_handling] Spawned async task for email ID %s", email_id)
 
     # Do not await tasks here, just let them run in the background
 
@@ -322,8 +438,7 @@ async def main():
     if telegram_bot:
         try:
             # Print status
-            print("\n=== Starting Telegram Bot ===")
-            print("Attempting to start Telegram bot...")
+            logger.info("Attempting to start Telegram bot...")
 
             # Start the Telegram bot
             await telegram_bot.start()
@@ -334,48 +449,54 @@ async def main():
                     chat_id=telegram_bot.chat_id,
                     text="🔄 System test message: The email monitoring system has been started. This message confirms that Telegram notifications are working."
                 )
-                print("✅ Test message sent successfully to Telegram")
+                logger.info("Test message sent successfully to Telegram")
             except Exception as e:
-                print(f"⚠️ Warning: Could not send test message, but the bot is still running: {str(e)}")
+                logger.warning("Could not send test message, but the bot is still running: %s", e)
 
             telegram_status = "enabled"
-            print("===========================\n")
         except Exception as e:
-            print(f"Error starting Telegram bot: {str(e)}")
-            print("Detailed error information:")
-            import traceback
-            traceback.print_exc()
-            print("\nDisabling Telegram functionality due to errors")
-            print("===========================\n")
+            logger.error(
+                "Error starting Telegram bot, disabling Telegram functionality: %s",
+                e,
+                exc_info=True,
+            )
             telegram_bot = None
 
     try:
         # Run the emailer with our custom process function
-        print("Starting email monitoring...")
+        logger.info("Starting email monitoring...")
         while True:
             await process_with_draft_handling(emailer, respond)
-            await asyncio.sleep(30)
+            # Block on IMAP IDLE until the server pushes new mail instead of
+            # polling every 30 seconds. Renew within 9 minutes since Gmail
+            # drops IDLE connections after ~10. Servers without IDLE keep
+            # their healthy connection and just sleep; only an actual IDLE
+            # failure drops the connection for a reconnect.
+            try:
+                imap_conn = await asyncio.to_thread(
+                    emailer._ensure_imap_connection
+                )
+                if emailer._supports_idle(imap_conn):
+                    await asyncio.to_thread(emailer.idle_wait, imap_conn, 9 * 60)
+                else:
+                    await asyncio.sleep(30)
+            except Exception as e:
+                logger.info("IMAP IDLE failed (%s), reconnecting; sleeping for 30s...", e)
+                await asyncio.to_thread(emailer._drop_imap_connection)
+                await asyncio.sleep(30)
     except KeyboardInterrupt:
-        print("\nKeyboard interrupt received, shutting down gracefully...")
+        logger.info("Keyboard interrupt received, shutting down gracefully...")
     except Exception as e:
-        print(f"\nError in email monitoring: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error("Error in email monitoring: %s", e, exc_info=True)
     finally:
         # Stop the Telegram bot when the emailer stops
         if telegram_bot and telegram_status == "enabled":
             try:
-                print("\n=== Stopping Telegram Bot ===")
-                print("Shutting down Telegram bot...")
+                logger.info("Shutting down Telegram bot...")
                 await telegram_bot.stop()
-                print("Telegram bot stopped successfully")
-                print("===========================\n")
+                logger.info("Telegram bot stopped successfully")
             except Exception as e:
-                print(f"Error stopping Telegram bot: {str(e)}")
-                print("Detailed error information:")
-                import traceback
-                traceback.print_exc()
-                print("===========================\n")
+                logger.error("Error stopping Telegram bot: %s", e, exc_info=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,66 @@
+import numpy as np
+from openai import AsyncOpenAI
+
+_EMBED_MODEL = "text-embedding-3-small"
+
+# Truncate very long bodies before embedding; the leading text carries the
+# question and keeps the embedding call cheap
+_MAX_EMBED_CHARS = 8000
+
+
+class SemanticCache:
+    """In-memory semantic cache for generated replies.
+
+    Many support emails are near-duplicates ("where's my refund?",
+    "cancel my subscription"). Embed the incoming body, compare against
+    previously answered ones by cosine similarity, and reuse the stored
+    reply on a close match — skipping the agent run entirely.
+    """
+
+    def __init__(self, threshold: float = 0.92, max_entries: int = 1000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._client = AsyncOpenAI()
+        # (n, d) float32 matrix of L2-normalized embeddings; rows align
+        # with self._values, oldest first
+        self._embeddings = None
+        self._values: list[str] = []
+
+    async def _embed(self, text: str) -> np.ndarray:
+        response = await self._client.embeddings.create(
+            model=_EMBED_MODEL, input=text[:_MAX_EMBED_CHARS]
+        )
+        embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    async def lookup(self, text: str):
+        """Return (cached_value, embedding); cached_value is None on miss.
+
+        The embedding is returned so a subsequent store() doesn't pay a
+        second embedding call.
+        """
+        embedding = await self._embed(text)
+        if self._embeddings is None or not self._values:
+            return None, embedding
+
+        # Normalized rows, so the dot product is the cosine similarity
+        scores = self._embeddings @ embedding
+        best = int(np.argmax(scores))
+        if float(scores[best]) >= self.threshold:
+            return self._values[best], embedding
+        return None, embedding
+
+    def store(self, embedding: np.ndarray, value: str) -> None:
+        row = embedding.reshape(1, -1)
+        if self._embeddings is None:
+            self._embeddings = row
+        else:
+            self._embeddings = np.vstack([self._embeddings, row])
+        self._values.append(value)
+
+        # Evict oldest entries beyond the cap
+        if len(self._values) > self.max_entries:
+            excess = len(self._values) - self.max_entries
+            self._embeddings = self._embeddings[excess:]
+            self._values = self._values[excess:]
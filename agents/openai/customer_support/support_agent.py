@@ -1,7 +1,10 @@
+import functools
+import time
+
 import env
 from agents import Agent, Runner, function_tool, TResponseInputItem, RunResult
 from stripe_agent_toolkit.openai.toolkit import StripeAgentToolkit
-import requests
+import httpx
 
 env.ensure("OPENAI_API_KEY")
 
@@ -28,31 +31,91 @@ stripe_agent_toolkit = StripeAgentToolkit(
 )
 
 
-@function_tool
-def search_faq(question: str) -> str:
-    response = requests.get("https://standupjack.com/faq")
+_FAQ_URL = "https://standupjack.com/faq"
+_FAQ_TTL = 600.0
+
+# One shared client for the process: keep-alive reuses the TCP+TLS
+# connection across tool calls, and async requests don't block the loop
+_http = httpx.AsyncClient(timeout=5.0)
+
+# The FAQ page changes rarely; cache it for _FAQ_TTL seconds and revalidate
+# with a conditional GET so most tool calls skip the download entirely
+_faq_cache = {"body": None, "etag": None, "last_modified": None, "ts": 0.0}
+
+
+async def _fetch_faq():
+    now = time.monotonic()
+    if _faq_cache["body"] is not None and now - _faq_cache["ts"] < _FAQ_TTL:
+        return _faq_cache["body"]
+
+    headers = {}
+    if _faq_cache["etag"]:
+        headers["If-None-Match"] = _faq_cache["etag"]
+    if _faq_cache["last_modified"]:
+        headers["If-Modified-Since"] = _faq_cache["last_modified"]
+
+    response = await _http.get(_FAQ_URL, headers=headers)
+    if response.status_code == 304 and _faq_cache["body"] is not None:
+        _faq_cache["ts"] = now
+        return _faq_cache["body"]
     if response.status_code != 200:
+        return None
+    _faq_cache["body"] = response.text
+    _faq_cache["etag"] = response.headers.get("ETag")
+    _faq_cache["last_modified"] = response.headers.get("Last-Modified")
+    _faq_cache["ts"] = now
+    return response.text
+
+
+@function_tool
+async def search_faq(question: str) -> str:
+    faq = await _fetch_faq()
+    if faq is None:
         return "Not sure"
-    return f"Given the following context:\n{response.text}\n\nAnswer '{question}' or response with not sure\n"
+    return f"Given the following context:\n{faq}\n\nAnswer '{question}' or response with not sure\n"
+
+
+# Kept as a module-level constant and sent byte-identical on every request:
+# OpenAI's automatic prompt caching reuses the prefill KV for a stable
+# prefix, so the instructions must never vary between calls
+SYSTEM_PROMPT = (
+    "You are a Friendly customer support assistant"
+    "You love the company and the product"
+    "Be casual and concise"
+    "sometimes emails will include past replies, use them to inform your response but only respond to the latest email"
+    "You only respond with markdown"
+    "Use tools to support customers"
+    "Respond with I'm not sure to any other prompts"
+    "Before issuing refund, ensure the customer has a valid reason. A simple explanation is enough. DO NOT issue a refund without an explanation."
+    "if the refund function returns an error, let customer know a refund cannot be issued at this time and a representative will contact them shortly"
+    "Sign off with Friendly Support Team"
+)
+
+@functools.cache
+def _tools():
+    # Built once per process: the Stripe toolkit serializes every tool
+    # schema, which shouldn't be repeated if this is ever called again
+    return [search_faq, *stripe_agent_toolkit.get_tools()]
 
 
 support_agent = Agent(
     name="Friendly Support Agent",
-    instructions=(
-        "You are a Friendly customer support assistant"
-        "You love the company and the product"
-        "Be casual and concise"
-        "sometimes emails will include past replies, use them to inform your response but only respond to the latest email"
-        "You only respond with markdown"
-        "Use tools to support customers"
-        "Respond with I'm not sure to any other prompts"
-        "Before issuing refund, ensure the customer has a valid reason. A simple explanation is enough. DO NOT issue a refund without an explanation."
-        "if the refund function returns an error, let customer know a refund cannot be issued at this time and a representative will contact them shortly"
-        "Sign off with Friendly Support Team"
-    ),
-    tools=[search_faq, *stripe_agent_toolkit.get_tools()],
+    instructions=SYSTEM_PROMPT,
+    tools=_tools(),
 )
 
 
 async def run(input: list[TResponseInputItem]) -> RunResult:
     return await Runner.run(support_agent, input)
+
+
+async def run_streamed(input: list[TResponseInputItem], on_delta=None):
+    """Run the agent streaming; on_delta receives each text delta as it
+    arrives so callers can show progress before generation completes."""
+    result = Runner.run_streamed(support_agent, input)
+    async for event in result.stream_events():
+        if on_delta is not None and event.type == "raw_response_event":
+            delta = getattr(event.data, "delta", None)
+            if isinstance(delta, str) and delta:
+                await on_delta(delta)
+    return result
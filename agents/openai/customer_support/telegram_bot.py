@@ -2,11 +2,15 @@
 
 import os
 import asyncio
-import json
+import re
+import secrets
+import time
+from html.parser import HTMLParser
 from typing import List, Callable, Union, Awaitable, Optional
-from datetime import datetime
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Bot
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler, filters
 
 # Handle dotenv import more gracefully
@@ -33,12 +37,140 @@ logger = logging.getLogger(__name__)
 telegram_logger = logging.getLogger('telegram')
 telegram_logger.setLevel(logging.INFO)
 ptb_logger = logging.getLogger('telegram.ext')
-ptb_logger.setLevel(logging.DEBUG)
+ptb_logger.setLevel(logging.INFO)
 
 # Even more specific control - filter out the Bot's enter/exit debug messages
 bot_logger = logging.getLogger('telegram.Bot')
 bot_logger.setLevel(logging.WARNING)
 
+# Compiled once; clean_text runs on every notification and callback
+_HTML_TAG_RE = re.compile(r'<[^>]*>')
+
+# Pending actions older than this are considered stuck (the wait itself
+# gives up after 3600s) and evicted so they can't pin email threads forever
+_PENDING_TTL = 3700.0
+
+
+class _TextExtractor(HTMLParser):
+    """Collects text content, handling entities and malformed markup that a
+    tag-stripping regex would pass through."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+
+    def handle_data(self, data: str):
+        self.parts.append(data)
+
+
+def clean_text(text: str, max_length: int = 300) -> str:
+    """Extract text from HTML and truncate for a Telegram preview.
+
+    The input is capped before parsing so megabyte quoted-reply chains are
+    never fully parsed just to be truncated to a few hundred chars.
+    """
+    capped = text[:max_length * 8]
+    try:
+        extractor = _TextExtractor()
+        extractor.feed(capped)
+        clean = " ".join("".join(extractor.parts).split())
+    except Exception:
+        clean = _HTML_TAG_RE.sub('', capped)
+    if len(clean) > max_length:
+        return clean[:max_length] + "..."
+    return clean
+
+
+@dataclass(slots=True)
+class PendingAction:
+    """A notification awaiting the operator's send/draft decision.
+
+    Slotted attributes are cheaper than the previous per-notification
+    dict-of-four-keys on the hot callback path.
+    """
+
+    email_thread: List[Email]
+    draft_email: Email
+    event: asyncio.Event
+    result: Optional[Email] = None
+    created_at: float = field(default_factory=time.monotonic)
+
+
+def _format_email_card(
+    most_recent: Email,
+    draft_email: Email,
+    *,
+    header: str,
+    footer: str = "",
+    html: bool = True,
+) -> str:
+    """Render the email + draft summary shown in Telegram messages.
+
+    One builder shared by the notification, its plain-text fallback and
+    the button-callback edit, so the card is formatted exactly once per
+    send instead of duplicated per call site.
+    """
+    email_body_clean = clean_text(most_recent.body, 300)
+    draft_body_clean = clean_text(draft_email.body, 500)
+    if html:
+        return (
+            f"📧 <b>{header}</b>\n\n"
+            f"<b>From:</b> {most_recent.from_address}\n"
+            f"<b>Subject:</b> {most_recent.subject}\n\n"
+            f"<b>Message:</b>\n{email_body_clean}\n\n"
+            f"<b>Draft Response:</b>\n{draft_body_clean}\n\n"
+            f"{footer}"
+        )
+    return (
+        f"📧 {header}\n\n"
+        f"From: {most_recent.from_address}\n"
+        f"Subject: {most_recent.subject}\n\n"
+        f"Message:\n{email_body_clean}\n\n"
+        f"Draft Response:\n{draft_body_clean}\n\n"
+        f"{footer}"
+    )
+
+
+class DraftPreview:
+    """A live "drafting..." Telegram message, edited as tokens stream in.
+
+    Edits are throttled to one every couple of seconds so streaming doesn't
+    hammer the Telegram API.
+    """
+
+    def __init__(self, bot, chat_id, message_id):
+        self._bot = bot
+        self._chat_id = chat_id
+        self._message_id = message_id
+        self._chunks: List[str] = []
+        self._last_edit = 0.0
+
+    async def on_delta(self, delta: str):
+        self._chunks.append(delta)
+        now = time.monotonic()
+        if now - self._last_edit < 2.0:
+            return
+        self._last_edit = now
+        text = "".join(self._chunks)
+        try:
+            await self._bot.edit_message_text(
+                chat_id=self._chat_id,
+                message_id=self._message_id,
+                text=f"✍️ Drafting response...\n\n{text[-3500:]}",
+            )
+        except Exception as e:
+            logger.debug(f"Draft preview edit failed: {e}")
+
+    async def finish(self):
+        """Remove the preview; the real notification follows separately."""
+        try:
+            await self._bot.delete_message(
+                chat_id=self._chat_id, message_id=self._message_id
+            )
+        except Exception as e:
+            logger.debug(f"Draft preview cleanup failed: {e}")
+
+
 class TelegramBot:
     def __init__(
         self,
@@ -76,23 +208,26 @@ class TelegramBot:
         # Build the application
         self.application = builder.build()
 
-        # Store a direct reference to the bot for manual polling
-        try:
-            # This works in all python-telegram-bot versions
-            self.bot = Bot(token=token)
-            logger.info("Created direct Bot instance for manual polling")
-        except Exception as e:
-            logger.warning(f"Could not create direct Bot instance: {e}")
-            # Fall back to the application's bot
-            self.bot = self.application.bot
+        # Pending actions keyed by action id; insertion-ordered so stale
+        # entries can be evicted oldest-first
+        self.pending_actions: "OrderedDict[str, PendingAction]" = OrderedDict()
 
-        self.pending_actions = {}  # Store pending actions with message_id as key
+        # Strong references to fire-and-forget tasks (message edits), so
+        # they aren't garbage-collected mid-flight
+        self._background_tasks = set()
         self._setup_handlers()
 
     def _setup_handlers(self):
         """Set up the command and callback handlers for the bot."""
-        self.application.add_handler(CommandHandler("start", self._start_command))
-        self.application.add_handler(CommandHandler("test", self._test_command))
+        # Single source of truth for command dispatch; PTB's CommandHandler
+        # matches each command without per-update startswith chains, and new
+        # commands only need an entry here
+        self._commands = {
+            "start": self._start_command,
+            "test": self._test_command,
+        }
+        for command, handler in self._commands.items():
+            self.application.add_handler(CommandHandler(command, handler))
         self.application.add_handler(CallbackQueryHandler(self._button_callback))
         self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self._message_handler))
 
@@ -111,7 +246,7 @@ class TelegramBot:
             # Create test inline keyboard
             keyboard = [
                 [
-                    InlineKeyboardButton("Test Button", callback_data=json.dumps({"action": "test", "value": "clicked"}))
+                    InlineKeyboardButton("Test Button", callback_data="test")
                 ]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
@@ -132,14 +267,15 @@ class TelegramBot:
     async def _button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle button callbacks for send/draft actions."""
         query = update.callback_query
-        logger.info(f"Received callback query from user {query.from_user.id} with data: {query.data}")
+        logger.debug("Received callback query from user %s with data: %s", query.from_user.id, query.data)
         await query.answer()
 
         # Extract the action and email ID from the callback data
         try:
-            data = json.loads(query.data)
-            action = data.get("action")
-            logger.info(f"Parsed callback data: action={action}")
+            # Payloads are "action|email_id": two fields don't need JSON,
+            # and str.partition is a single C call per click
+            action, _, email_id = (query.data or "").partition("|")
+            logger.debug("Parsed callback data: action=%s", action)
 
             # Handle test button clicks
             if action == "test":
@@ -151,65 +287,46 @@ class TelegramBot:
                 return
 
             # Handle email actions
-            email_id = data.get("email_id")
-            logger.info(f"Processing email action: {action} for email_id: {email_id}")
+            logger.debug("Processing email action: %s for email_id: %s", action, email_id)
 
-            if email_id in self.pending_actions:
-                logger.info(f"Found pending action for email_id: {email_id}")
-                email_thread = self.pending_actions[email_id]["email_thread"]
-                draft_email = self.pending_actions[email_id]["draft_email"]
+            pending = self.pending_actions.get(email_id)
+            if pending is not None:
+                logger.debug("Found pending action for email_id: %s", email_id)
+                email_thread = pending.email_thread
+                draft_email = pending.draft_email
 
                 # Get the original message content
                 most_recent = email_thread[-1]
 
-                # Helper function to clean HTML and limit text
-                def clean_text(text: str, max_length: int = 300) -> str:
-                    # Remove HTML tags
-                    import re
-                    clean = re.sub(r'<[^>]*>', '', text)
-                    # Limit length and add ellipsis if needed
-                    if len(clean) > max_length:
-                        return clean[:max_length] + "..."
-                    return clean
-
-                # Get clean versions of email body text
-                email_body_clean = clean_text(most_recent.body, 300)
-                draft_body_clean = clean_text(draft_email.body, 500)
-
                 # Format the original message part
-                original_message = (
-                    f"📧 <b>Support Email</b>\n\n"
-                    f"<b>From:</b> {most_recent.from_address}\n"
-                    f"<b>Subject:</b> {most_recent.subject}\n\n"
-                    f"<b>Message:</b>\n{email_body_clean}\n\n"
-                    f"<b>Draft Response:</b>\n{draft_body_clean}\n\n"
+                original_message = _format_email_card(
+                    most_recent, draft_email, header="Support Email"
                 )
 
                 if action == "send":
                     logger.info(f"User chose to send the email to {draft_email.to_address}")
-                    # Append confirmation to original message
-                    await query.edit_message_text(
+                    # Signal first so the email send starts immediately;
+                    # the confirmation edit is cosmetic and runs in the
+                    # background rather than costing a Telegram round trip
+                    # before the real work
+                    pending.result = draft_email
+                    pending.event.set()
+                    logger.debug("Set event for email_id: %s with action: send", email_id)
+                    self._edit_in_background(
+                        query,
                         text=f"{original_message}<b>✅ Email will be sent!</b>",
-                        reply_markup=None,
-                        parse_mode="HTML"
                     )
-                    # Return the draft email for sending
-                    self.pending_actions[email_id]["result"] = draft_email
-                    self.pending_actions[email_id]["event"].set()
-                    logger.info(f"Set event for email_id: {email_id} with action: send")
 
                 elif action == "draft":
                     logger.info(f"User chose to save email as draft")
-                    # Append confirmation to original message
-                    await query.edit_message_text(
+                    # Return None to indicate save as draft
+                    pending.result = None
+                    pending.event.set()
+                    logger.debug("Set event for email_id: %s with action: draft", email_id)
+                    self._edit_in_background(
+                        query,
                         text=f"{original_message}<b>📝 Email saved as draft!</b>",
-                        reply_markup=None,
-                        parse_mode="HTML"
                     )
-                    # Return None to indicate save as draft
-                    self.pending_actions[email_id]["result"] = None
-                    self.pending_actions[email_id]["event"].set()
-                    logger.info(f"Set event for email_id: {email_id} with action: draft")
             else:
                 logger.warning(f"No pending action found for email_id: {email_id}")
                 await query.edit_message_text(
@@ -221,6 +338,52 @@ class TelegramBot:
             logger.error(f"Error processing callback: {e}", exc_info=True)
             await query.edit_message_text(text=f"Error: {str(e)}")
 
+    def _edit_in_background(self, query, text: str):
+        """Fire a confirmation edit without blocking the caller on the
+        Telegram round trip."""
+        async def edit():
+            # Swallow edit failures here so the fire-and-forget task never
+            # leaves an unretrieved exception behind
+            try:
+                await query.edit_message_text(
+                    text=text, reply_markup=None, parse_mode="HTML"
+                )
+            except Exception as e:
+                logger.warning(f"Confirmation edit failed: {e}")
+
+        task = asyncio.create_task(edit())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def _build_markup(self, unique_id: str) -> InlineKeyboardMarkup:
+        """Build the send/draft keyboard; only the action id varies."""
+        # Tuples rather than lists: immutable and slightly cheaper through
+        # PTB's TelegramObject validation
+        return InlineKeyboardMarkup((
+            (
+                InlineKeyboardButton(
+                    "Send Response", callback_data=f"send|{unique_id}"
+                ),
+                InlineKeyboardButton(
+                    "Save as Draft", callback_data=f"draft|{unique_id}"
+                ),
+            ),
+        ))
+
+    async def start_draft_preview(self, email: Email) -> Union[DraftPreview, None]:
+        """Post a placeholder that streams the draft as it is generated."""
+        try:
+            sent = await self.application.bot.send_message(
+                chat_id=self.chat_id,
+                text=f"✍️ Drafting response to {email.from_address}...",
+            )
+            return DraftPreview(
+                self.application.bot, self.chat_id, sent.message_id
+            )
+        except Exception as e:
+            logger.warning(f"Could not start draft preview: {e}")
+            return None
+
     async def notify_and_wait_for_action(self, email_thread: List[Email], draft_email: Email) -> Union[Email, None]:
         """
         Send notification to Telegram about new email and wait for action.
@@ -239,46 +402,27 @@ class TelegramBot:
         most_recent = email_thread[-1]
         logger.info(f"Processing notification for email from {most_recent.from_address} with subject: {most_recent.subject}")
 
-        # Create a unique ID for this action
-        unique_id = most_recent.id or str(datetime.now().timestamp())
+        # Create a unique ID for this action. The fallback is a short
+        # opaque token rather than a 17+ byte timestamp string, keeping the
+        # callback_data payload small.
+        unique_id = most_recent.id or secrets.token_urlsafe(6)
         logger.debug(f"Generated unique_id for action: {unique_id}")
 
-        # Helper function to clean HTML and limit text
-        def clean_text(text: str, max_length: int = 300) -> str:
-            # Remove HTML tags
-            import re
-            clean = re.sub(r'<[^>]*>', '', text)
-            # Limit length and add ellipsis if needed
-            if len(clean) > max_length:
-                return clean[:max_length] + "..."
-            return clean
-
-        # Get clean versions of email body text
-        email_body_clean = clean_text(most_recent.body, 300)
-        draft_body_clean = clean_text(draft_email.body, 500)
-
         # Format the message with email details and draft response
-        message = (
-            f"📧 <b>New Support Email</b>\n\n"
-            f"<b>From:</b> {most_recent.from_address}\n"
-            f"<b>Subject:</b> {most_recent.subject}\n\n"
-            f"<b>Message:</b>\n{email_body_clean}\n\n"
-            f"<b>Draft Response:</b>\n{draft_body_clean}\n\n"
-            f"What would you like to do with this draft?"
+        message = _format_email_card(
+            most_recent,
+            draft_email,
+            header="New Support Email",
+            footer="What would you like to do with this draft?",
         )
 
-        # Create inline keyboard with send and draft buttons
-        keyboard = [
-            [
-                InlineKeyboardButton("Send Response", callback_data=json.dumps({"action": "send", "email_id": unique_id})),
-                InlineKeyboardButton("Save as Draft", callback_data=json.dumps({"action": "draft", "email_id": unique_id}))
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        # Create the inline keyboard with send and draft buttons; the pipe
+        # encoding keeps callback_data tiny (well inside Telegram's 64-byte
+        # limit) and needs no JSON parse on the click path
+        reply_markup = self._build_markup(unique_id)
 
         logger.info(f"Sending notification to Telegram chat {self.chat_id}")
-        logger.debug(f"Callback data for Send: {json.dumps({'action': 'send', 'email_id': unique_id})}")
-        logger.debug(f"Callback data for Draft: {json.dumps({'action': 'draft', 'email_id': unique_id})}")
+        logger.debug("Registered callbacks send|%s and draft|%s", unique_id, unique_id)
 
         # Send the message and get the message object
         try:
@@ -291,14 +435,14 @@ class TelegramBot:
             logger.info(f"Successfully sent notification message to Telegram (ID: {sent_message.message_id})")
         except Exception as e:
             logger.error(f"Error sending HTML message: {e}")
-            # Fallback to plain text if HTML parsing fails
-            message_plain = (
-                f"📧 New Support Email\n\n"
-                f"From: {most_recent.from_address}\n"
-                f"Subject: {most_recent.subject}\n\n"
-                f"Message:\n{email_body_clean}\n\n"
-                f"Draft Response:\n{draft_body_clean}\n\n"
-                f"What would you like to do with this draft?"
+            # Fallback to plain text if HTML parsing fails; only built on
+            # this rare path
+            message_plain = _format_email_card(
+                most_recent,
+                draft_email,
+                header="New Support Email",
+                footer="What would you like to do with this draft?",
+                html=False,
             )
             logger.info("Retrying with plain text message")
             sent_message = await self.application.bot.send_message(
@@ -311,24 +455,38 @@ class TelegramBot:
         # Create an event to wait for the callback
         event = asyncio.Event()
 
+        # Evict entries stuck past their lifetime (e.g. a callback crashed
+        # before signaling); insertion order puts the oldest first, so this
+        # stops at the first live entry
+        now = time.monotonic()
+        while self.pending_actions:
+            oldest = next(iter(self.pending_actions.values()))
+            if now - oldest.created_at <= _PENDING_TTL:
+                break
+            self.pending_actions.popitem(last=False)
+
         # Store the pending action
-        self.pending_actions[unique_id] = {
-            "email_thread": email_thread,
-            "draft_email": draft_email,
-            "event": event,
-            "result": None
-        }
+        self.pending_actions[unique_id] = PendingAction(
+            email_thread=email_thread,
+            draft_email=draft_email,
+            event=event,
+        )
         logger.info(f"Registered action with ID {unique_id}, waiting for response")
 
         # Wait for the event to be set (when the user clicks a button)
         try:
-            logger.info(f"Waiting for user response (timeout: 3600s)")
-            await asyncio.wait_for(event.wait(), timeout=3600)  # 1 hour timeout
-            result = self.pending_actions[unique_id]["result"]
-            del self.pending_actions[unique_id]
+            logger.info("Waiting for user response (timeout: 3600s)")
+            # asyncio.timeout (3.11+) uses the loop's timer directly, with
+            # no wrapper-task allocation or cancellation teardown the way
+            # wait_for has
+            async with asyncio.timeout(3600):  # 1 hour timeout
+                await event.wait()
+            # One hash lookup instead of separate get + del
+            pending = self.pending_actions.pop(unique_id, None)
+            result = pending.result if pending else None
             logger.info(f"Received user response: {'send email' if result else 'save as draft'}")
             return result
-        except asyncio.TimeoutError:
+        except TimeoutError:
             # If no action is taken within the timeout, remove the buttons
             logger.warning(f"Timeout waiting for user response, removing buttons")
             await self.application.bot.edit_message_reply_markup(
@@ -336,7 +494,7 @@ class TelegramBot:
                 message_id=sent_message.message_id,
                 reply_markup=None
             )
-            del self.pending_actions[unique_id]
+            self.pending_actions.pop(unique_id, None)
             logger.info("Action timed out, returning None (save as draft)")
             return None
 
@@ -351,8 +509,31 @@ class TelegramBot:
             # Start the application (bot framework)
             await self.application.start()
 
-            # Start polling in a separate task
-            self._polling_task = asyncio.create_task(self._start_polling())
+            # Webhook mode: Telegram pushes updates to us over an open
+            # connection, eliminating the polling task and its idle API
+            # traffic entirely. Enabled when TELEGRAM_WEBHOOK_URL is set;
+            # polling remains the default fallback.
+            webhook_url = os.getenv("TELEGRAM_WEBHOOK_URL")
+            webhook_started = False
+            if webhook_url and self.application.updater:
+                try:
+                    port = int(os.getenv("TELEGRAM_WEBHOOK_PORT", "8443"))
+                    await self.application.updater.start_webhook(
+                        listen="0.0.0.0",
+                        port=port,
+                        url_path=self.token,
+                        webhook_url=f"{webhook_url.rstrip('/')}/{self.token}",
+                        allowed_updates=self.allowed_updates,
+                    )
+                    logger.info(f"Webhook server listening on port {port}")
+                    webhook_started = True
+                except Exception as e:
+                    # e.g. PTB installed without the [webhooks] extra;
+                    # notifications matter more than the delivery mechanism
+                    logger.error(f"Webhook start failed, falling back to polling: {e}")
+            if not webhook_started:
+                # Start polling in a separate task
+                self._polling_task = asyncio.create_task(self._start_polling())
 
             # Send a startup message
             await self.application.bot.send_message(
@@ -377,40 +558,59 @@ class TelegramBot:
             while True:
                 try:
                     logger.debug("Requesting updates from Telegram...")
-                    # Get updates every 1 second from our direct bot instance
-                    updates = await self.bot.get_updates(
+                    # True long polling: the server holds the request open
+                    # until updates arrive (or 30s passes), so an idle bot
+                    # makes ~2 requests a minute instead of ~60. The read
+                    # timeout must outlast the server-side wait.
+                    # Polling shares the application bot's HTTP pool
+                    # instead of a second Bot with its own TLS connections
+                    updates = await self.application.bot.get_updates(
                         offset=self._offset,
-                        timeout=1,
+                        timeout=30,
+                        read_timeout=35,
                         allowed_updates=self.allowed_updates
                     )
 
-                    logger.debug(f"Received {len(updates)} updates")
+                    logger.debug("Received %d updates", len(updates))
 
-                    # Process updates
-                    for update in updates:
-                        # Update offset to acknowledge this update
-                        self._offset = update.update_id + 1
+                    # Acknowledge the whole batch up front: the offset only
+                    # needs the last update id, and advancing it before
+                    # dispatch means a handler failure can't re-deliver
+                    if updates:
+                        self._offset = updates[-1].update_id + 1
 
-                        # Log detailed information about the update
+                    # Enqueue the batch; PTB's dispatcher processes the
+                    # updates concurrently (concurrent_updates=True), so a
+                    # slow edit_message_text in one handler doesn't block
+                    # the next admin's button press
+                    for update in updates:
+                        # Log detailed information about the update.
+                        # telegram.Update always defines these attributes
+                        # (None when absent), so the truthiness check is all
+                        # that's needed — no hasattr probing
                         update_type = "unknown"
-                        if hasattr(update, "callback_query") and update.callback_query:
+                        if update.callback_query:
                             update_type = "callback_query"
-                            callback_data = getattr(update.callback_query, "data", "unknown")
-                            logger.info(f"Received callback query with data: {callback_data}")
-                        elif hasattr(update, "message") and update.message:
+                            logger.debug("Received callback query with data: %s", update.callback_query.data)
+                        elif update.message:
                             update_type = "message"
-                            if hasattr(update.message, "text"):
-                                logger.info(f"Received message: {update.message.text}")
+                            if update.message.text:
+                                logger.debug("Received message: %s", update.message.text)
                             else:
-                                logger.info("Received message without text")
+                                logger.debug("Received message without text")
 
-                        logger.info(f"Received update ID: {update.update_id}, type: {update_type}")
+                        logger.debug("Received update ID: %s, type: %s", update.update_id, update_type)
 
-                        # Process using our direct handler
-                        await self.process_update(update)
+                        # Hand off to PTB's dispatcher: the handlers
+                        # registered in _setup_handlers route the update,
+                        # honoring concurrent_updates and handler-group
+                        # short-circuiting
+                        await self.application.update_queue.put(update)
 
-                    # Small delay to prevent tight loop
-                    await asyncio.sleep(0.1)
+                    # No sleep here: long polling blocks server-side until
+                    # updates arrive, so the next get_updates should be
+                    # issued immediately. Only one task ever runs this loop
+                    # (created once in start()), so requests never overlap.
                 except Exception as e:
                     logger.error(f"Error in polling loop: {e}", exc_info=True)
                     await asyncio.sleep(1)  # Wait a bit before retrying
@@ -433,6 +633,13 @@ class TelegramBot:
                 except asyncio.CancelledError:
                     logger.info("Polling task cancelled successfully")
 
+            # Stop the webhook listener if one was started
+            try:
+                if self.application.updater and self.application.updater.running:
+                    await self.application.updater.stop()
+            except Exception as e:
+                logger.warning(f"Error stopping webhook listener: {e}")
+
             # Graceful shutdown
             try:
                 # Stop the application
@@ -475,36 +682,3 @@ class TelegramBot:
             logger.warning("Could not detect python-telegram-bot version")
 
         return cls(token=token, chat_id=chat_id, admin_ids=admin_ids)
-
-    async def process_update(self, update):
-        """Process a single update using our handlers directly."""
-        try:
-            logger.debug(f"Processing update directly: {update.update_id}")
-
-            # Handle callback queries
-            if hasattr(update, "callback_query") and update.callback_query:
-                logger.info("Handling callback query directly")
-                await self._button_callback(update, None)
-                return
-
-            # Handle messages
-            if hasattr(update, "message") and update.message:
-                logger.info("Handling message directly")
-
-                # Check if it's a command
-                if hasattr(update.message, "text"):
-                    text = update.message.text
-                    if text.startswith('/start'):
-                        await self._start_command(update, None)
-                        return
-                    elif text.startswith('/test'):
-                        await self._test_command(update, None)
-                        return
-
-                # Otherwise treat as regular message
-                await self._message_handler(update, None)
-                return
-
-            logger.warning(f"Received update of unknown type: {update}")
-        except Exception as e:
-            logger.error(f"Error in direct update processing: {e}", exc_info=True)